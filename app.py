@@ -1,9 +1,19 @@
 import logging
+import time
+
+try:
+    import uvloop
+    uvloop.install()  # Before anything creates a loop
+except ImportError:
+    pass
+
 import handlers
+import redis.asyncio as aioredis
 
 from robyn import Robyn
 from events.hik.events import router as hik_events_router
-from tasks.task import health_check
+from events.background import event_writer, stop_background_tasks
+import config
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +21,23 @@ app = Robyn(__file__)
 
 app.startup_handler(handlers.create_all_tables)
 
+# Flushes the ingest queue on a graceful stop. With --processes > 1 Robyn's parent
+# answers SIGTERM by killing the children outright, so no shutdown handler runs there;
+# those processes answer each event only after its batch is committed instead
+app.shutdown_handler(stop_background_tasks)
+event_writer.ack_after_commit = app.config.processes > 1
+
 app.include_router(hik_events_router)
 
+_redis = None
+
+def get_redis():
+    """Lazily created so the client binds to the worker's running loop"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(config.REDIS_URL)
+    return _redis
+
 @app.get("/health")
 def index():
     return {"status": "ok"}
@@ -21,11 +46,14 @@ def index():
 async def celery_health():
     """Health check endpoint to verify Celery connectivity"""
     try:
-        result = health_check.delay()
-        health_status = result.get(timeout=5)
-        return {"celery_status": "ok", "details": health_status}
+        # Written by the health_check beat task; missing once it has stopped running
+        ts = await get_redis().get(config.CELERY_HEALTH_KEY)
+        if ts is None:
+            return {"celery_status": "stale"}
+        return {"celery_status": "ok", "last_ok_seconds_ago": round(time.time() - float(ts), 1)}
     except Exception as e:
         return {"celery_status": "error", "error": str(e)}
 
 if __name__ == "__main__":
-    app.start(host="0.0.0.0", port=8080)
+    # Worker/process counts come from --workers/--processes (see docker-compose.yml)
+    app.start(host="0.0.0.0", port=8080, _check_port=False)
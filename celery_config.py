@@ -1,6 +1,4 @@
-import asyncio
 from celery import Celery
-from celery.signals import worker_process_init
 import config
 
 # Configure Celery
@@ -28,6 +26,7 @@ celery.conf.update(
     worker_pool="solo",
     
     # Worker configuration
+    # The solo pool runs one task at a time, so anything reserved beyond it waits behind the outbox batch
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
     
@@ -35,9 +34,13 @@ celery.conf.update(
     beat_schedule={
         'process-outbox-events': {
             'task': 'tasks.task.process_outbox_events',
-            'schedule': 10.0,  # Run every 10 seconds
+            'schedule': config.OUTBOX_RELAY_INTERVAL_SECONDS,  # Safety net; failed web publishes wake it sooner
             'options': {'queue': 'outbox'}
         },
+        'celery-health-check': {
+            'task': 'tasks.task.health_check',
+            'schedule': config.CELERY_HEALTH_TTL / 2,  # Refresh well before the key expires
+        },
     },
     
     # Result backend settings
@@ -52,9 +55,4 @@ celery.conf.update(
     worker_disable_rate_limits=True,
 )
 
-
-# Patch asyncio for Celery
-@worker_process_init.connect
-def init_worker(**kwargs):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
\ No newline at end of file
+# The per-process event loop is set up in tasks.task (worker_process_init / first task)
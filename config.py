@@ -14,6 +14,18 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if APP_ENV == 'test':
     DATABASE_URL = TEST_DATABASE_URL
 
+# Log every SQL statement (sqlalchemy.engine at INFO); off by default
+LOG_SQL = os.getenv('LOG_SQL', '') == '1'
+
+# Multipart field carrying the Hik event JSON; other fields are scanned if it's missing
+HIK_EVENT_FIELD = os.getenv('HIK_EVENT_FIELD', 'event_log')
+
+# Rich panels for every received event (dev only; far too slow for production traffic)
+PRETTY_LOG = os.getenv('PRETTY_LOG', '') == '1'
+
+# Connections for the asyncpg COPY ingest pool (per web process)
+ASYNCPG_POOL_SIZE = int(os.getenv('ASYNCPG_POOL_SIZE', '5'))
+
 LANGUAGE_CODE = 'en'
 TIME_ZONE = 'Asia/Tashkent'
 
@@ -25,6 +37,11 @@ tz = ZoneInfo(TIME_ZONE)
 # Redis URL for Celery broker and result backend
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+# Celery liveness: the health_check beat task refreshes this key, /health/celery reads it
+CELERY_HEALTH_KEY = os.getenv('CELERY_HEALTH_KEY', 'celery:last_ok')
+
+CELERY_HEALTH_TTL = int(os.getenv('CELERY_HEALTH_TTL', '30'))
+
 
 # Kafka
 KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
@@ -33,4 +50,37 @@ DEFAULT_KAFKA_TOPIC = os.getenv('DEFAULT_KAFKA_TOPIC', 'attendance_records')
 
 DEFAULT_CLIENT_ID = os.getenv('DEFAULT_CLIENT_ID', 'time-pay-event-producer')
 
+# Wire format for message values: "json" or "msgpack" (published to "<topic>.msgpack")
+KAFKA_MESSAGE_FORMAT = os.getenv('KAFKA_MESSAGE_FORMAT', 'json')
+
+# gzip, snappy, lz4 or zstd (aiokafka needs cramjam for all but gzip); empty or "none" disables it
+KAFKA_COMPRESSION_TYPE = os.getenv('KAFKA_COMPRESSION_TYPE', 'lz4')
+
+
+# Outbox relay
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+
+# The Celery relay leaves rows this fresh to the web workers' immediate publish
+OUTBOX_RELAY_GRACE_SECONDS = int(os.getenv('OUTBOX_RELAY_GRACE_SECONDS', '30'))
+
+# Beat interval for the Celery relay; a safety net, since web workers wake it when a publish fails
+OUTBOX_RELAY_INTERVAL_SECONDS = float(os.getenv('OUTBOX_RELAY_INTERVAL_SECONDS', '300'))
+
+# Per web process, at most one relay wakeup per window
+OUTBOX_WAKEUP_DEBOUNCE_SECONDS = float(os.getenv('OUTBOX_WAKEUP_DEBOUNCE_SECONDS', '5'))
+
+
+# Event ingest (web workers)
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '50000'))
+
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '500'))
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+
+
+# In-process publish queue (web workers)
+PUBLISH_QUEUE_SIZE = int(os.getenv('PUBLISH_QUEUE_SIZE', '10000'))
+
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '2'))
 
+PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', '64'))
@@ -1,3 +1,8 @@
+import asyncio
+import functools
+import logging
+import asyncpg
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 from sqlalchemy.future import select
@@ -5,39 +10,64 @@ from sqlalchemy.engine import create_engine
 
 import config
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = config.DATABASE_URL
 DATABASE_URL_SYNC = DATABASE_URL.replace("+asyncpg", "")
 
+# SQL tracing is opt-in (LOG_SQL=1); echo=True would format every statement even when nobody reads it
+logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if config.LOG_SQL else logging.WARNING)
+
+# Server-side TCP keepalives so idle connections killed by the network are noticed early
+SERVER_SETTINGS = {"tcp_keepalives_idle": "60"}
+
+# No pre-ping (a SELECT 1 round trip on every checkout); stale connections are
+# recycled early instead, and retry_on_disconnect covers the rare dead one
 engine = create_async_engine(
     DATABASE_URL,
-    echo=False if config.APP_ENV == "prod" else True,
+    echo=False,
     pool_size=20,
     max_overflow=30,
-    pool_recycle=3600,
-    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_pre_ping=False,
+    connect_args={"server_settings": SERVER_SETTINGS},
 )
 
+# Same policy for the sync (psycopg2) engine: no pre-ping, libpq keepalives, earlier recycling
 sync_engine = create_engine(
     DATABASE_URL_SYNC,
-    echo=False if config.APP_ENV == "prod" else True,
+    echo=False,
     pool_size=20,
-    max_overflow=30,
-    pool_recycle=3600,
-    pool_pre_ping=True,
+    max_overflow=10,
+    pool_recycle=1800,
+    pool_pre_ping=False,
+    connect_args={"keepalives": 1, "keepalives_idle": 60},
 )
 
 SessionLocal = sessionmaker(bind=sync_engine, expire_on_commit=False, autoflush=False, autocommit=False)
 
 AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False, autocommit=False)
 
+# Raw asyncpg pool for bulk COPY ingest on the hot path (same database, libpq-style DSN)
+asyncpg_pool = None
+_asyncpg_pool_lock = asyncio.Lock()
+
 class Base(DeclarativeBase):
     __abstract__ = True
 
+    _column_names: tuple = ()
+
+    def __init_subclass__(cls, **kwargs):
+        # Mapping happens in DeclarativeBase.__init_subclass__, so __table__ exists afterwards
+        super().__init_subclass__(**kwargs)
+        table = getattr(cls, "__table__", None)
+        cls._column_names = tuple(column.name for column in table.columns) if table is not None else ()
+
     def __repr__(self):
         return f"<{self.__class__.__name__} id={self.id}>"
 
     def to_dict(self):
-        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
+        return {name: getattr(self, name) for name in self._column_names}
 
     def __str__(self):
         return f"{self.__class__.__name__}(id={self.id})"
@@ -51,6 +81,66 @@ async def get_async_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_asyncpg_pool() -> asyncpg.Pool:
+    """Get or create the asyncpg pool used for bulk ingest"""
+    global asyncpg_pool
+
+    if asyncpg_pool is None:
+        # Concurrent writers may all arrive before the first pool exists; only one creates it
+        async with _asyncpg_pool_lock:
+            if asyncpg_pool is None:
+                asyncpg_pool = await asyncpg.create_pool(
+                    DATABASE_URL_SYNC,
+                    min_size=1,
+                    max_size=config.ASYNCPG_POOL_SIZE,
+                    max_inactive_connection_lifetime=300,
+                    server_settings=SERVER_SETTINGS,
+                )
+
+    return asyncpg_pool
+
+
+async def close_asyncpg_pool():
+    """Close the bulk-ingest pool, if one was created"""
+    global asyncpg_pool
+
+    if asyncpg_pool is not None:
+        await asyncpg_pool.close()
+        asyncpg_pool = None
+
+
+def retry_on_disconnect(func):
+    """Run a DB coroutine again, once, if it failed on a dead pooled connection"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except DBAPIError as e:
+            if not e.connection_invalidated:
+                raise
+            logger.warning("Database connection lost in %s, retrying once: %s", func.__name__, e)
+        except asyncpg.exceptions.ConnectionDoesNotExistError as e:
+            logger.warning("Database connection lost in %s, retrying once: %s", func.__name__, e)
+        return await func(*args, **kwargs)
+    return wrapper
+
+
+async def execute_with_retry(session, statement, params=None):
+    """Execute one statement on a session, again after a rollback if its pooled connection was dead
+
+    Only the statement is repeated, so callers with side effects outside the
+    database (e.g. Kafka sends) can retry their DB steps without redoing them.
+    """
+    try:
+        return await session.execute(statement, params)
+    except DBAPIError as e:
+        if not e.connection_invalidated:
+            raise
+        logger.warning("Database connection lost, retrying statement once: %s", e)
+    except asyncpg.exceptions.ConnectionDoesNotExistError as e:
+        logger.warning("Database connection lost, retrying statement once: %s", e)
+    await session.rollback()
+    return await session.execute(statement, params)
 
 
 async def create_db_tables():
@@ -58,7 +148,10 @@ async def create_db_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
+@retry_on_disconnect
 async def _test_db_connection():
     """Test database connectivity"""
-    async with AsyncSessionLocal() as db:
-        await db.execute(select(1))
\ No newline at end of file
+    # AUTOCOMMIT: the probe is a bare SELECT 1, without BEGIN/ROLLBACK round trips around it
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(select(1))
\ No newline at end of file
@@ -1,18 +1,27 @@
 import asyncio
 import logging
-from typing import List
-from sqlalchemy import select
-from db import AsyncSessionLocal
+import asyncpg
+import random
+import time
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select, update
+from db import AsyncSessionLocal, close_asyncpg_pool, get_asyncpg_pool, retry_on_disconnect
+from events.models import Event
 from outbox.models import OutboxEvent
-from producer import get_producer_service, MessagePriority
-from datetime import datetime
+from outbox.codec import encode_payload, publishable_payload, PAYLOAD_FORMAT_MSGPACK
+from producer import cleanup_producer_service, get_producer_service, MessagePriority
+from tasks.repository import _publish_events_by_ids
+from celery_config import celery
+from datetime import datetime, timezone
+import config
 
 logger = logging.getLogger(__name__)
 
 class OutboxProcessor:
-    def __init__(self, batch_size: int = 50, poll_interval: float = 1.0):
+    def __init__(self, batch_size: int = 50, poll_interval: float = 0.1, max_poll_interval: float = 2.0):
         self.batch_size = batch_size
-        self.poll_interval = poll_interval
+        self.poll_interval = poll_interval  # idle polling starts here and grows...
+        self.max_poll_interval = max_poll_interval  # ...up to this cap
         self.running = False
         self.producer = None
     
@@ -27,66 +36,378 @@ class OutboxProcessor:
     
     async def stop(self):
         """Stop the background processor"""
+        if not self.running:
+            return
         self.running = False
         logger.info("Outbox processor stopped")
     
     async def _process_loop(self):
         """Main processing loop"""
+        idle_polls = 0
+        error_count = 0
         while self.running:
             try:
-                await self._process_batch()
-                await asyncio.sleep(self.poll_interval)
+                rows = await self._process_batch()
+                error_count = 0
             except Exception as e:
-                logger.error(f"Error in outbox processor: {e}")
-                await asyncio.sleep(5)  # Back off on error
+                # Exponential backoff with jitter so replicas don't retry in lockstep
+                error_count += 1
+                delay = min(60.0, 0.5 * 2 ** min(error_count, 7)) * random.uniform(0.5, 1.5)
+                logger.error("Error in outbox processor (retrying in %.1fs): %s", delay, e)
+                await asyncio.sleep(delay)
+                continue
+
+            # The backlog is drained by _process_batch, so only idle polls back off
+            idle_polls = idle_polls + 1 if rows == 0 else 0
+            delay = min(self.max_poll_interval, self.poll_interval * 2 ** min(idle_polls, 7)) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
+    
+    async def _process_batch(self) -> int:
+        """Drain outbox events page by page, returning how many were published"""
+        published_total = 0
+        while True:
+            claimed, published = await self._process_page()
+            published_total += published
+            # A short page means the backlog is empty; no progress means Kafka is failing
+            if claimed < self.batch_size or not published:
+                return published_total
     
-    async def _process_batch(self):
-        """Process a batch of outbox events"""
+    async def _process_page(self) -> Tuple[int, int]:
+        """Process one page of outbox events, returning (claimed, published) counts"""
         async with AsyncSessionLocal() as db:
-            # Get unprocessed events
+            # Lock the rows we take; concurrent processors skip them instead of waiting
             result = await db.execute(
                 select(OutboxEvent)
                 .where(OutboxEvent.processed == False)
                 .order_by(OutboxEvent.created_at)
                 .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
             )
             events = result.scalars().all()
             
             if not events:
-                return
+                return 0, 0
             
-            logger.debug(f"Processing {len(events)} outbox events")
-            
-            for event in events:
-                try:
-                    # Send to Kafka
-                    result = await self.producer.send_event(
+            # Pipeline the Kafka sends instead of awaiting them one by one
+            results = await asyncio.gather(
+                *(
+                    self.producer.send_event(
                         event_type=event.event_type,
-                        data=event.payload,
+                        data=publishable_payload(event.payload, event.payload_format, self.producer.config.message_format),
                         source="event-listener",
                         priority=MessagePriority.NORMAL,
                         correlation_id=str(event.id)
                     )
-                    
-                    if result["success"]:
-                        # Mark as processed
-                        event.processed = True
-                        event.processed_at = datetime.utcnow()
-                        await db.commit()
-                        logger.debug(f"Published outbox event {event.id}")
-                    else:
-                        logger.warning(f"Failed to publish outbox event {event.id}: {result}")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing outbox event {event.id}: {e}")
+                    for event in events
+                ),
+                return_exceptions=True
+            )
+            
+            ok_ids = []
+            for event, result in zip(events, results):
+                if isinstance(result, Exception):
+                    logger.error("Error processing outbox event %s: %s", event.id, result)
+                elif result["success"]:
+                    ok_ids.append(event.id)
+                else:
+                    logger.warning("Failed to publish outbox event %s: %s", event.id, result)
+            
+            if ok_ids:
+                # Mark the whole batch as processed in one statement
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ok_ids))
+                    .values(processed=True, processed_at=func.now())
+                )
+            # Also releases the row locks taken for failed events
+            await db.commit()
+            logger.debug("Outbox page: published %d of %d events", len(ok_ids), len(events))
+            return len(events), len(ok_ids)
+
+class EventPublishQueue:
+    """Bounded queue of outbox ids drained by a few long-lived publish workers"""
+
+    def __init__(self, maxsize: int = 10_000, workers: int = 2, batch_size: int = 64):
+        self.queue: asyncio.Queue[int] = asyncio.Queue(maxsize=maxsize)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+
+    def publish(self, event_id: int) -> bool:
+        """Queue an outbox event for publishing; returns False if the queue is full"""
+        if not self.running:
+            # Started lazily so the workers live on the loop serving requests
+            self._start()
+        try:
+            self.queue.put_nowait(event_id)
+        except asyncio.QueueFull:
+            logger.warning("Publish queue full, leaving outbox event %s to the outbox processor", event_id)
+            _wake_relay()
+            return False
+        return True
+
+    def _start(self):
+        self.running = True
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Publish queue started with %d workers", self.workers)
+
+    async def stop(self):
+        """Stop the publish workers; unsent ids stay in the outbox"""
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Publish queue stopped")
+
+    async def _worker(self):
+        """Take whatever is queued, up to batch_size ids, and publish it in one go"""
+        while True:
+            event_ids = [await self.queue.get()]
+            while len(event_ids) < self.batch_size and not self.queue.empty():
+                event_ids.append(self.queue.get_nowait())
+            try:
+                if await _publish_events_by_ids(event_ids):
+                    _wake_relay()
+            except Exception as e:
+                logger.error("Error publishing outbox events %s: %s", event_ids, e)
+                _wake_relay()
+            finally:
+                for _ in event_ids:
+                    self.queue.task_done()
+
+_last_wakeup = 0.0
+
+
+def _wake_relay():
+    """Schedule a Celery relay run for rows the web couldn't publish, at most once per debounce window"""
+    global _last_wakeup
+    now = time.monotonic()
+    if now - _last_wakeup < config.OUTBOX_WAKEUP_DEBOUNCE_SECONDS:
+        return
+    _last_wakeup = now
+    # send_task is a blocking broker call; keep it off the event loop
+    asyncio.get_running_loop().run_in_executor(None, _send_relay_task)
+
+
+def _send_relay_task():
+    try:
+        # The relay skips rows younger than the grace period, so run once they've aged past it;
+        # the debounce window covers failures this call suppresses after it was scheduled
+        celery.send_task(
+            "tasks.task.process_outbox_events",
+            countdown=config.OUTBOX_RELAY_GRACE_SECONDS + config.OUTBOX_WAKEUP_DEBOUNCE_SECONDS,
+        )
+    except Exception as e:
+        logger.warning("Could not schedule outbox relay: %s", e)
+
+
+_EVENT_COLUMNS = Event._column_names
+_PURPOSE_INDEX = _EVENT_COLUMNS.index("purpose")
+_OUTBOX_COLUMNS = (
+    "id", "aggregate_id", "aggregate_type", "event_type",
+    "payload", "payload_format", "created_at", "processed", "processed_at",
+)
+
+# (aggregate_type, event_type, payload) for events that also need an outbox row
+OutboxSpec = Tuple[str, str, dict]
+
+# Errors caused by a row's contents rather than the database being unavailable; retrying can't fix them
+_BAD_ROW_ERRORS = (
+    asyncpg.exceptions.DataError,
+    asyncpg.exceptions.IntegrityConstraintViolationError,
+    OverflowError, TypeError, ValueError,
+)
+
+
+class EventWriter:
+    """Group-commits queued events and their outbox rows using COPY"""
+
+    def __init__(self, maxsize: int = 50_000, batch_size: int = 500, workers: int = 2):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+        # Set where queued events could be lost without the shutdown flush (see app.py)
+        self.ack_after_commit = False
+
+    def submit(self, event: Event, outbox: Optional[OutboxSpec] = None) -> bool:
+        """Queue an event for the next COPY batch without waiting; returns False if the queue is full"""
+        return self._put(event, outbox, None)
+
+    async def write(self, event: Event, outbox: Optional[OutboxSpec] = None) -> bool:
+        """Queue an event, waiting for its commit if ack_after_commit is set; returns False if the queue is full"""
+        if not self.ack_after_commit:
+            return self.submit(event, outbox)
+        future = asyncio.get_running_loop().create_future()
+        if not self._put(event, outbox, future):
+            return False
+        # Raises if the database rejected the row
+        await future
+        return True
+
+    def _put(self, event: Event, outbox: Optional[OutboxSpec], future: Optional[asyncio.Future]) -> bool:
+        if not self.running:
+            self._start()
+        try:
+            self.queue.put_nowait((event, outbox, future))
+        except asyncio.QueueFull:
+            logger.warning("Ingest queue full, rejecting event %s", event.serial_no)
+            return False
+        return True
+
+    def _start(self):
+        self.running = True
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info("Event writer started with %d workers", self.workers)
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what is already queued, then stop the writers"""
+        if self.running:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Event writer stopped with %d events unwritten", self.queue.qsize())
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Event writer stopped")
+
+    async def _run(self):
+        """Drain up to batch_size queued events per transaction"""
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                outbox_ids = await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            for _, _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+            for outbox_id in outbox_ids:
+                if outbox_id is not None:
+                    publish_queue.publish(outbox_id)
+
+    async def _write(self, batch) -> List[Optional[int]]:
+        """Write a batch, retrying until the database takes it; only rows it rejects are dropped
+
+        Submitted events were already acknowledged, so an outage holds the batch here
+        instead of losing it; the queue fills up and submit() starts refusing events.
+        """
+        failures = 0
+        while True:
+            try:
+                return await self._copy_batch(batch)
+            except _BAD_ROW_ERRORS as e:
+                if len(batch) == 1:
+                    event, _, future = batch[0]
+                    logger.error("Dropping event %s the database rejects: %s", event.serial_no, e)
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                    return [None]
+                # One bad row fails the whole COPY; write row by row to isolate it
+                logger.warning("Batch of %d events rejected, writing them one by one: %s", len(batch), e)
+                outbox_ids = []
+                for item in batch:
+                    outbox_ids.extend(await self._write([item]))
+                return outbox_ids
+            except Exception as e:
+                failures += 1
+                delay = min(30.0, 0.5 * 2 ** min(failures, 6)) * random.uniform(0.5, 1.5)
+                logger.error("Error writing %d events (retrying in %.1fs): %s", len(batch), delay, e)
+                await asyncio.sleep(delay)
+
+    @retry_on_disconnect
+    async def _copy_batch(self, batch) -> List[Optional[int]]:
+        """Insert a batch with one COPY per table in a single transaction"""
+        now = datetime.now(timezone.utc)
+        outbox_count = sum(1 for _, outbox, _ in batch if outbox is not None)
+        pool = await get_asyncpg_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # COPY can't return ids, so reserve them from the sequences up front
+                event_ids = await _reserve_ids(conn, "events", len(batch))
+                outbox_seq = iter(await _reserve_ids(conn, "outbox_events", outbox_count))
+
+                event_records = []
+                outbox_records = []
+                outbox_ids = []
+                for (event, outbox, _), event_id in zip(batch, event_ids):
+                    event.id = event_id
+                    if event.created_at is None:
+                        event.created_at = now
+                    event_records.append(_event_record(event))
+
+                    if outbox is None:
+                        outbox_ids.append(None)
+                        continue
+                    aggregate_type, event_type, payload = outbox
+                    outbox_id = next(outbox_seq)
+                    outbox_records.append((
+                        outbox_id, str(event_id), aggregate_type, event_type,
+                        encode_payload(payload), PAYLOAD_FORMAT_MSGPACK, now, False, None,
+                    ))
+                    outbox_ids.append(outbox_id)
+
+                await conn.copy_records_to_table("events", records=event_records, columns=_EVENT_COLUMNS)
+                if outbox_records:
+                    await conn.copy_records_to_table("outbox_events", records=outbox_records, columns=_OUTBOX_COLUMNS)
+        return outbox_ids
+
+
+def _event_record(event: Event) -> tuple:
+    """Row tuple for COPY in _EVENT_COLUMNS order"""
+    record = [getattr(event, column) for column in _EVENT_COLUMNS]
+    if event.purpose is not None:
+        # The Postgres enum stores member names, as SQLAlchemy writes them
+        record[_PURPOSE_INDEX] = event.purpose.name
+    return tuple(record)
+
+
+async def _reserve_ids(conn, table: str, count: int) -> List[int]:
+    """Take count ids from the table's id sequence in one round trip"""
+    if not count:
+        return []
+    rows = await conn.fetch(
+        "SELECT nextval(pg_get_serial_sequence($1, 'id')) FROM generate_series(1, $2)",
+        table, count,
+    )
+    return [row[0] for row in rows]
+
 
 # Global processor instance
-outbox_processor = OutboxProcessor()
+outbox_processor = OutboxProcessor(batch_size=config.OUTBOX_BATCH_SIZE)
+
+# Global publish queue instance
+publish_queue = EventPublishQueue(
+    maxsize=config.PUBLISH_QUEUE_SIZE,
+    workers=config.PUBLISH_WORKERS,
+    batch_size=config.PUBLISH_BATCH_SIZE,
+)
+
+# Global event writer instance
+event_writer = EventWriter(
+    maxsize=config.INGEST_QUEUE_SIZE,
+    batch_size=config.INGEST_BATCH_SIZE,
+    workers=config.INGEST_WORKERS,
+)
 
 async def start_background_tasks():
     """Start all background tasks"""
     await outbox_processor.start()
 
 async def stop_background_tasks():
-    """Stop all background tasks"""
-    await outbox_processor.stop()
\ No newline at end of file
+    """Stop all background tasks; queued events are written before their connections close"""
+    await outbox_processor.stop()
+    # Flushes accepted events to the database; their publishes fall back to the outbox relay
+    await event_writer.stop()
+    await publish_queue.stop()
+    await close_asyncpg_pool()
+    await cleanup_producer_service()
\ No newline at end of file
@@ -6,13 +6,15 @@ async def create_event(event: Event, db: AsyncSession) -> Event:
     """
     Create a new event in the database.
     
+    The event is flushed, not committed, so its id is populated while the
+    caller keeps control of the transaction.
+
     :param event: The event to create.
     :param db: The database session.
     :return: The created event.
     """
     db.add(event)
-    await db.commit()
-    await db.refresh(event)
+    await db.flush()
     return event
 
 
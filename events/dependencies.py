@@ -1,20 +1,33 @@
 import logging
-import json
 from robyn import Request, exceptions, status_codes
+import config
 
 logger = logging.getLogger(__name__)
 
 
-async def extract_event_data(request: Request) -> str:
-    json_string = next(
-        (value for key, value in request.form_data.items() if not isinstance(value, bytearray) and "eventType" in str(value)),
-        None
-    )
+def _is_event_json(value) -> bool:
+    # Pictures arrive as bytearray parts and are never scanned.
+    if type(value) is str:
+        return "eventType" in value
+    if type(value) is bytes:
+        return b"eventType" in value
+    return False
+
+
+async def extract_event_data(request: Request) -> str | bytes:
+    form_data = request.form_data
+    # Devices name the part consistently, so try it before scanning every field
+    json_string = form_data.get(config.HIK_EVENT_FIELD)
+    if not _is_event_json(json_string):
+        json_string = next(
+            (value for value in form_data.values() if _is_event_json(value)),
+            None
+        )
     if not json_string:
         raise exceptions.HTTPException(status_code=status_codes.HTTP_400_BAD_REQUEST, detail="Invalid event data")
-    logger.debug("Extracted JSON string: %s", json_string)
-    event_data = json.loads(json_string)
-    return event_data
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted JSON string: %s", json_string)
+    return json_string
 
 
 
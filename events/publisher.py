@@ -25,11 +25,11 @@ class EventPublisher:
                 priority=priority
             )
             if result["success"]:
-                logger.info(f"Successfully published {event_type} to Kafka")
+                logger.debug("Successfully published %s to Kafka", event_type)
             else:
-                logger.error(f"Failed to publish {event_type}: {result}")
+                logger.error("Failed to publish %s: %s", event_type, result)
         except Exception as e:
-            logger.error(f"Error publishing {event_type} to Kafka: {e}")
+            logger.error("Error publishing %s to Kafka: %s", event_type, e)
     
     def publish_event_background(self, event_data: dict, event_type: str, priority: MessagePriority = MessagePriority.NORMAL):
         """Fire-and-forget background publishing"""
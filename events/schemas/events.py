@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, RootModel
 from typing import Optional, Union, Annotated, Literal
 from datetime import datetime
 
@@ -51,4 +51,8 @@ class AccessControllerEvent(BaseModel):
 EventUnion = Annotated[
     Union[HeartbeatInfo, EventNotificationAlert],
     Field(discriminator="event_type")
-]
\ No newline at end of file
+]
+
+
+class EventRoot(RootModel[EventUnion]):
+    """Incoming Hik event, dispatched to a concrete model on eventType."""
@@ -1,15 +1,78 @@
 import logging
+import queue
+import threading
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
 from rich.pretty import Pretty
 from events.schemas.events import EventNotificationAlert, HeartbeatInfo
+import config
+
+logger = logging.getLogger(__name__)
+
+# Rendering happens on one background thread, so request handlers never wait on the console lock
+_pretty_queue: queue.Queue = queue.Queue(maxsize=1000)
+_pretty_thread = None
+_pretty_thread_lock = threading.Lock()
+
+
+def _pretty_worker() -> None:
+    console = Console()
+    while True:
+        render, obj = _pretty_queue.get()
+        try:
+            render(console, obj)
+        except Exception:
+            logger.exception("Pretty logging failed")
+
+
+def _enqueue_pretty(render, obj) -> None:
+    global _pretty_thread
+    if _pretty_thread is None:
+        with _pretty_thread_lock:
+            if _pretty_thread is None:
+                _pretty_thread = threading.Thread(target=_pretty_worker, name="pretty-log", daemon=True)
+                _pretty_thread.start()
+    try:
+        _pretty_queue.put_nowait((render, obj))
+    except queue.Full:
+        pass  # Dev-only output; drop rather than slow the handler
 
-console = Console()
 
 def log_pretty_event(event: EventNotificationAlert) -> None:
     """Pretty print and log an EventNotificationAlert."""
-    
+    if not config.PRETTY_LOG:
+        logger.debug("[Event] %s from %s at %s", event.event_type, event.device_id, event.date_time)
+        return
+    _enqueue_pretty(_render_event, event)
+
+
+def log_pretty_heartbeat(heartbeat: HeartbeatInfo) -> None:
+    """Pretty print and log a HeartbeatInfo."""
+    if not config.PRETTY_LOG:
+        logger.debug("[Heartbeat] at %s", heartbeat.date_time)
+        return
+    _enqueue_pretty(_render_heartbeat, heartbeat)
+
+
+# (display label, AccessControllerEvent attribute) for the [AC] rows of the event panel
+_AC_KEYS = tuple(
+    (f"[AC] {label}", attr)
+    for label, attr in (
+        ("Employee No", "person_id"),
+        ("Employee Name", "person_name"),
+        ("Verify Mode", "current_verify_mode"),
+        ("Attendance Status", "attendance_status"),
+        ("User Type", "user_type"),
+        ("Card No", "card_no"),
+        ("Swipe Type", "swipe_card_type"),
+        ("Mask", "mask"),
+        ("Pictures", "pictures_number"),
+    )
+)
+
+
+def _render_event(console: Console, event: EventNotificationAlert) -> None:
     # Prepare header
     header_text = Text(f"📡 Event Type: {event.event_type}", style="bold cyan")
     header_text.append(f" | 📅 Time: {event.date_time}", style="dim")
@@ -25,34 +88,22 @@ def log_pretty_event(event: EventNotificationAlert) -> None:
         "Minor Event": event.access_controller_event.minor_event,
     }
 
-    # Prepare inner AccessControllerEvent data if available
+    # Add inner AccessControllerEvent data if available
     ace = event.access_controller_event or None
     if ace:
-        ace_data = {
-            "Employee No": ace.person_id,
-            "Employee Name": ace.person_name,
-            "Verify Mode": ace.current_verify_mode,
-            "Attendance Status": ace.attendance_status,
-            "User Type": ace.user_type,
-            "Card No": ace.card_no,
-            "Swipe Type": ace.swipe_card_type,
-            "Mask": ace.mask,
-            "Pictures": ace.pictures_number,
-        }
-
-        # Merge into core data for display
-        core_data |= {f"[AC] {k}": v for k, v in ace_data.items() if v is not None}
+        for label, attr in _AC_KEYS:
+            value = getattr(ace, attr)
+            if value is not None:
+                core_data[label] = value
 
     # Use rich Panel to output
     console.print(Panel(Pretty(core_data, expand_all=True), title=header_text))
 
     # Additionally log to standard logger if needed
-    logging.info(f"[Event] {event.event_type} from {event.device_id} at {event.date_time}")
+    logger.info("[Event] %s from %s at %s", event.event_type, event.device_id, event.date_time)
 
 
-def log_pretty_heartbeat(heartbeat: HeartbeatInfo) -> None:
-    """Pretty print and log a HeartbeatInfo."""
-    
+def _render_heartbeat(console: Console, heartbeat: HeartbeatInfo) -> None:
     # Prepare header
     header_text = Text("💓 Heartbeat Event", style="bold green")
     header_text.append(f" | 📅 Time: {heartbeat.date_time}", style="dim")
@@ -69,4 +120,4 @@ def log_pretty_heartbeat(heartbeat: HeartbeatInfo) -> None:
     console.print(Panel(Pretty(core_data, expand_all=True), title=header_text))
 
     # Additionally log to standard logger if needed
-    logging.info(f"[Heartbeat] at {heartbeat.date_time}")
\ No newline at end of file
+    logger.info("[Heartbeat] at %s", heartbeat.date_time)
\ No newline at end of file
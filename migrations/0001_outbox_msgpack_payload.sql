@@ -0,0 +1,11 @@
+-- Store outbox payloads as msgpack in BYTEA instead of JSONB.
+-- Existing rows keep their JSON text and are tagged payload_format = 'json'
+-- so the relays can still decode them during the rollout.
+BEGIN;
+
+ALTER TABLE outbox_events ADD COLUMN payload_format VARCHAR NOT NULL DEFAULT 'json';
+ALTER TABLE outbox_events ALTER COLUMN payload_format DROP DEFAULT;
+ALTER TABLE outbox_events
+    ALTER COLUMN payload TYPE BYTEA USING convert_to(payload::text, 'UTF8');
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- Partial index for the outbox polling query
+--   WHERE processed = false ORDER BY created_at LIMIT n
+-- Only pending rows are indexed, so the scan cost tracks the backlog, not the table size.
+-- CONCURRENTLY cannot run inside a transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_outbox_unprocessed
+    ON outbox_events (created_at)
+    WHERE processed = false;
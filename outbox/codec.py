@@ -0,0 +1,28 @@
+import msgspec
+
+PAYLOAD_FORMAT_MSGPACK = "msgpack"
+PAYLOAD_FORMAT_JSON = "json"  # rows written before the msgpack switch
+
+# Shared by every writer and relay; msgspec encoders/decoders are reusable and thread-safe
+_ENCODER = msgspec.msgpack.Encoder()
+_DECODER = msgspec.msgpack.Decoder()
+_JSON_DECODER = msgspec.json.Decoder()
+
+
+def encode_payload(payload: dict) -> bytes:
+    """Pack an outbox payload for storage"""
+    return _ENCODER.encode(payload)
+
+
+def publishable_payload(data: bytes, payload_format: str, wire_format: str):
+    """Payload for a Kafka envelope: stored bytes are embedded as-is when already in the wire format"""
+    if payload_format == wire_format:
+        return msgspec.Raw(data)
+    return decode_payload(data, payload_format)
+
+
+def decode_payload(data: bytes, payload_format: str = PAYLOAD_FORMAT_MSGPACK) -> dict:
+    """Unpack a stored outbox payload according to its payload_format"""
+    if payload_format == PAYLOAD_FORMAT_JSON:
+        return _JSON_DECODER.decode(data)
+    return _DECODER.decode(data)
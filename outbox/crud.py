@@ -1,15 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from outbox.models import OutboxEvent
+from outbox.codec import encode_payload
 
 
-async def add_to_outbox(db: AsyncSession, aggregate_id: str, aggregate_type: str, event_type: str, payload: dict):
-    """Add event to outbox for eventual Kafka publishing"""
+async def add_to_outbox(db: AsyncSession, aggregate_id: str, aggregate_type: str, event_type: str, payload: dict, flush: bool = False):
+    """Add event to outbox for eventual Kafka publishing; pass flush=True if the caller needs the id before commit"""
     outbox_event = OutboxEvent(
         aggregate_id=aggregate_id,
         aggregate_type=aggregate_type,
         event_type=event_type,
-        payload=payload
+        payload=encode_payload(payload)
     )
     db.add(outbox_event)
-    await db.flush()
+    if flush:
+        await db.flush()
     return outbox_event
+
@@ -1,21 +1,26 @@
 from datetime import timezone
-from sqlalchemy import String, DateTime, Boolean
+from sqlalchemy import String, DateTime, Boolean, LargeBinary, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
 import config
 from db import Base
+from outbox.codec import PAYLOAD_FORMAT_MSGPACK
 
 
 class OutboxEvent(Base):
     __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Relays poll "processed = false ORDER BY created_at"; only pending rows are indexed
+        Index("ix_outbox_unprocessed", "created_at", postgresql_where=text("processed = false")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     aggregate_id: Mapped[str] = mapped_column(String, nullable=False)  # event.id
     aggregate_type: Mapped[str] = mapped_column(String, nullable=False)  # "Event" or "Heartbeat"
     event_type: Mapped[str] = mapped_column(String, nullable=False)  # "event.created", "heartbeat.created"
-    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)  # see outbox.codec
+    payload_format: Mapped[str] = mapped_column(String, nullable=False, default=PAYLOAD_FORMAT_MSGPACK)  # "msgpack" or legacy "json"
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     processed: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -5,18 +5,21 @@ Production-ready Kafka producer for integration with listening services
 """
 
 import asyncio
-import json
+import functools
 import logging
+import random
 import time
 import uuid
 
 from enum import Enum
 
 from datetime import datetime
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Union
+from dataclasses import dataclass, replace
 
+import msgspec
 from aiokafka import AIOKafkaProducer
+from aiokafka.codec import has_gzip, has_lz4, has_snappy, has_zstd
 from aiokafka.errors import KafkaError, KafkaTimeoutError
 
 import config
@@ -24,31 +27,114 @@ import config
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def _enc_hook(obj: Any) -> Any:
+    """Fallback for types msgspec doesn't encode natively (datetime, UUID, Enum are built in)"""
+    return str(obj)
+
+# Value encoder and topic suffix per wire format; msgpack goes to its own topics so JSON consumers keep working
+_FORMATS = {
+    "json": (msgspec.json.Encoder(enc_hook=_enc_hook), ""),
+    "msgpack": (msgspec.msgpack.Encoder(enc_hook=_enc_hook), ".msgpack"),
+}
+
+_tick_ms = 0
+_tick_iso = ""
+
+def _now_iso() -> str:
+    """datetime.now().isoformat(), formatted at most once per millisecond"""
+    global _tick_ms, _tick_iso
+    now = time.time()
+    ms = int(now * 1000)
+    if ms != _tick_ms:
+        _tick_ms = ms
+        _tick_iso = datetime.fromtimestamp(now).isoformat()
+    return _tick_iso
+
+def _start_backoff(failures: int) -> float:
+    """Seconds to wait before another producer start after `failures` consecutive failures"""
+    return min(60.0, 2 ** min(failures, 6)) * random.uniform(0.5, 1.5)
+
+_CODECS = {"gzip": has_gzip, "snappy": has_snappy, "lz4": has_lz4, "zstd": has_zstd}
+
+def _available_compression(codec: Optional[str]) -> Optional[str]:
+    """codec if aiokafka can use it here, else None; AIOKafkaProducer refuses to start on a missing library"""
+    if not codec or codec.lower() == "none":
+        return None
+    if codec not in _CODECS or _CODECS[codec]():
+        # Unknown names are left for aiokafka to reject
+        return codec
+    logger.warning("Compression library for %s not found, sending uncompressed", codec)
+    return None
+
+# Checked once at import so a missing codec library can't keep every producer start failing
+COMPRESSION_TYPE = _available_compression(config.KAFKA_COMPRESSION_TYPE)
+
 class MessagePriority(Enum):
     LOW = "low"
     NORMAL = "normal" 
     HIGH = "high"
     CRITICAL = "critical"
 
+# Delivery/batching trade-offs; ProducerConfig.profile names the one applied
+PRODUCER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Fire at the leader and move on: lowest latency, may lose messages
+    "low_latency": {"acks": 0, "enable_idempotence": False, "linger_ms": 0, "compression_type": None},
+    # Leader ack only, big lazy batches: for bulk, replayable streams
+    "high_throughput": {
+        "acks": 1, "enable_idempotence": False,
+        "linger_ms": 100, "max_batch_size": 262144, "compression_type": COMPRESSION_TYPE,
+    },
+    # All in-sync replicas + idempotence: no loss, per-partition order kept
+    "durable": {"acks": "all", "enable_idempotence": True},
+}
+
+# Profile send_event uses for each priority; only LOW traffic trades durability for latency
+PRIORITY_PROFILES = {
+    MessagePriority.LOW: "low_latency",
+    MessagePriority.NORMAL: "durable",
+    MessagePriority.HIGH: "durable",
+    MessagePriority.CRITICAL: "durable",
+}
+
 @dataclass
 class ProducerConfig:
     """Producer configuration settings"""
     bootstrap_servers: str = config.KAFKA_BOOTSTRAP_SERVERS
     default_topic: str = config.DEFAULT_KAFKA_TOPIC
     client_id: str = config.DEFAULT_CLIENT_ID
-    acks: str = "all"
+    profile: str = "durable"
+    acks: Union[int, str] = "all"
     enable_idempotence: bool = True
     retry_backoff_ms: int = 100
     request_timeout_ms: int = 30000
-    compression_type: str = "gzip"
+    compression_type: Optional[str] = COMPRESSION_TYPE
+    message_format: str = config.KAFKA_MESSAGE_FORMAT
+    # Batching: wait up to linger_ms to fill a per-partition batch of max_batch_size bytes
+    linger_ms: int = 5
+    max_batch_size: int = 65536
     max_retries: int = 5
     retry_delay: float = 1.0
+    max_retry_delay: float = 10.0
 
-@dataclass
-class Message:
+    @classmethod
+    def for_profile(cls, profile: str, **overrides) -> "ProducerConfig":
+        """Config with one of PRODUCER_PROFILES applied"""
+        return cls(profile=profile, **{**PRODUCER_PROFILES[profile], **overrides})
+
+    @classmethod
+    def for_high_throughput(cls, **overrides) -> "ProducerConfig":
+        """Bigger, lazier batches for bulk relays; leader-only acks"""
+        return cls.for_profile("high_throughput", **overrides)
+
+    def with_profile(self, profile: str) -> "ProducerConfig":
+        """Copy of this config (same cluster, topic, format) switched to another profile"""
+        return replace(self, profile=profile, **PRODUCER_PROFILES[profile])
+
+class Message(msgspec.Struct, kw_only=True, gc=False):
     """Standard message format for the time-pay ecosystem"""
+    # gc=False: messages never form reference cycles, so the cyclic GC needn't track them
     event_type: str
-    data: Dict[str, Any]
+    data: Union[Dict[str, Any], msgspec.Raw]  # Raw: already encoded in the wire format
     source: str
     priority: str = MessagePriority.NORMAL.value  # Store as string value
     message_id: Optional[str] = None
@@ -56,12 +142,15 @@ class Message:
     correlation_id: Optional[str] = None
     user_id: Optional[str] = None
     session_id: Optional[str] = None
+    # Set by the producer on send
+    producer_timestamp: Optional[str] = None
+    topic: Optional[str] = None
     
     def __post_init__(self):
         if self.message_id is None:
             self.message_id = str(uuid.uuid4())
         if self.timestamp is None:
-            self.timestamp = datetime.now().isoformat()
+            self.timestamp = _now_iso()
         # Convert enum to string if passed as enum
         if isinstance(self.priority, MessagePriority):
             self.priority = self.priority.value
@@ -71,8 +160,15 @@ class KafkaProducerService:
     
     def __init__(self, config: Optional[ProducerConfig] = None):
         self.config = config or ProducerConfig()
+        self._encoder, self._topic_suffix = _FORMATS[self.config.message_format]
         self.producer: Optional[AIOKafkaProducer] = None
         self.is_running = False
+        # Lazily started producers for the other profiles send_event routes to
+        self._profile_services: Dict[str, "KafkaProducerService"] = {}
+        self._profile_lock = asyncio.Lock()
+        # Consecutive start failures per profile, so a down broker isn't retried on every send
+        self._profile_failures: Dict[str, int] = {}
+        self._profile_retry_at: Dict[str, float] = {}
         self.stats = {
             "messages_sent": 0,
             "messages_failed": 0,
@@ -85,11 +181,11 @@ class KafkaProducerService:
         try:
             logger.info(f"Starting Kafka Producer Service...")
             logger.info(f"Bootstrap servers: {self.config.bootstrap_servers}")
-            logger.info(f"Default topic: {self.config.default_topic}")
+            logger.info(f"Default topic: {self.config.default_topic}{self._topic_suffix}")
             
             self.producer = AIOKafkaProducer(
                 bootstrap_servers=self.config.bootstrap_servers,
-                value_serializer=self._serialize_value,
+                # Values arrive already encoded (see _prepare), so no value_serializer
                 key_serializer=self._serialize_key,
                 client_id=self.config.client_id,
                 
@@ -99,6 +195,10 @@ class KafkaProducerService:
                 retry_backoff_ms=self.config.retry_backoff_ms,
                 request_timeout_ms=self.config.request_timeout_ms,
                 compression_type=self.config.compression_type,
+
+                # Batching settings
+                linger_ms=self.config.linger_ms,
+                max_batch_size=self.config.max_batch_size,
             )
             
             await self.producer.start()
@@ -110,10 +210,20 @@ class KafkaProducerService:
             
         except Exception as e:
             logger.error(f"❌ Failed to start Kafka Producer Service: {e}")
+            if self.producer is not None:
+                # Close the half-started client so a later start() doesn't leak its connections
+                try:
+                    await self.producer.stop()
+                except Exception:
+                    pass
+                self.producer = None
             return False
     
     async def stop(self):
         """Gracefully stop the producer"""
+        for service in self._profile_services.values():
+            await service.stop()
+        self._profile_services = {}
         if self.producer and self.is_running:
             try:
                 logger.info("Stopping Kafka Producer Service...")
@@ -143,30 +253,22 @@ class KafkaProducerService:
         if not self.is_running or not self.producer:
             raise RuntimeError("Producer service not started")
         
-        target_topic = topic or self.config.default_topic
-        key = partition_key or message.user_id or message.session_id
-        
-        # Add metadata to message
-        message_dict = asdict(message)
-        message_dict.update({
-            "producer_timestamp": datetime.now().isoformat(),
-            "topic": target_topic
-        })
+        # Encoded once up front; retries and stats reuse the same bytes
+        target_topic, key, payload = self._prepare(message, topic, partition_key)
         
         for attempt in range(self.config.max_retries):
             try:
-                logger.debug(f"Sending message {message.message_id} (attempt {attempt + 1})")
+                logger.debug("Sending message %s (attempt %d)", message.message_id, attempt + 1)
                 
                 record_metadata = await self.producer.send_and_wait(
                     topic=target_topic,
-                    value=message_dict,
-                    key=key,
-                    timestamp_ms=int(time.time() * 1000)
+                    value=payload,
+                    key=key
                 )
                 
                 # Update statistics
                 self.stats["messages_sent"] += 1
-                self.stats["total_bytes_sent"] += len(json.dumps(message_dict))
+                self.stats["total_bytes_sent"] += len(payload)
                 
                 result = {
                     "success": True,
@@ -178,23 +280,23 @@ class KafkaProducerService:
                     "attempts": attempt + 1
                 }
                 
-                logger.debug(f"✅ Message {message.message_id} sent to {target_topic}[{record_metadata.partition}]@{record_metadata.offset}")
+                logger.debug("✅ Message %s sent to %s[%s]@%s", message.message_id, target_topic, record_metadata.partition, record_metadata.offset)
                 return result
                 
             except KafkaTimeoutError as e:
-                logger.warning(f"⏰ Timeout sending message {message.message_id} (attempt {attempt + 1}): {e}")
+                logger.warning("⏰ Timeout sending message %s (attempt %d): %s", message.message_id, attempt + 1, e)
                 if attempt < self.config.max_retries - 1:
-                    await asyncio.sleep(self.config.retry_delay * (attempt + 1))
+                    await asyncio.sleep(self._retry_delay(attempt))
                     continue
                     
             except KafkaError as e:
-                logger.error(f"❌ Kafka error sending message {message.message_id} (attempt {attempt + 1}): {e}")
+                logger.error("❌ Kafka error sending message %s (attempt %d): %s", message.message_id, attempt + 1, e)
                 if attempt < self.config.max_retries - 1:
-                    await asyncio.sleep(self.config.retry_delay * (attempt + 1))
+                    await asyncio.sleep(self._retry_delay(attempt))
                     continue
                     
             except Exception as e:
-                logger.error(f"💥 Unexpected error sending message {message.message_id}: {e}")
+                logger.error("💥 Unexpected error sending message %s: %s", message.message_id, e)
                 break
         
         # All retries failed
@@ -206,6 +308,55 @@ class KafkaProducerService:
             "attempts": self.config.max_retries
         }
     
+    async def send_message_nowait(
+        self,
+        message: Message,
+        topic: Optional[str] = None,
+        partition_key: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Queue a message on the producer without waiting for the broker ack
+        
+        Only blocks while the producer's buffer is full. Delivery is counted
+        in stats by a done-callback; use send_message when the caller needs
+        confirmation or retries.
+        
+        Args:
+            message: Message object to send
+            topic: Optional topic override
+            partition_key: Optional partition key for message routing
+            
+        Returns:
+            Future resolving to the record metadata
+        """
+        if not self.is_running or not self.producer:
+            raise RuntimeError("Producer service not started")
+        
+        target_topic, key, payload = self._prepare(message, topic, partition_key)
+        future = await self.producer.send(target_topic, value=payload, key=key)
+        future.add_done_callback(functools.partial(self._on_delivery, message.message_id, len(payload)))
+        return future
+    
+    def _prepare(self, message: Message, topic: Optional[str], partition_key: Optional[str]):
+        """Resolve topic and key and encode the message with its producer metadata"""
+        target_topic = (topic or self.config.default_topic) + self._topic_suffix
+        key = partition_key or message.user_id or message.session_id
+        
+        # Add metadata to message; the Struct is encoded directly, without an intermediate dict
+        message.producer_timestamp = _now_iso()
+        message.topic = target_topic
+        return target_topic, key, self._serialize_value(message)
+    
+    def _on_delivery(self, message_id: str, size: int, future: asyncio.Future):
+        """Stats accounting for send_message_nowait deliveries"""
+        if future.cancelled() or future.exception() is not None:
+            self.stats["messages_failed"] += 1
+            logger.error("❌ Delivery failed for message %s: %s", message_id,
+                         "cancelled" if future.cancelled() else future.exception())
+        else:
+            self.stats["messages_sent"] += 1
+            self.stats["total_bytes_sent"] += size
+    
     async def send_batch(
         self, 
         messages: List[Message], 
@@ -214,6 +365,9 @@ class KafkaProducerService:
         """
         Send multiple messages efficiently
         
+        Messages are not retried individually; aiokafka's own retries
+        (retry_backoff_ms within request_timeout_ms) still apply.
+        
         Args:
             messages: List of Message objects
             topic: Optional topic override
@@ -221,24 +375,48 @@ class KafkaProducerService:
         Returns:
             List of send results
         """
+        if not self.is_running or not self.producer:
+            raise RuntimeError("Producer service not started")
+
         if not messages:
             return []
             
-        logger.info(f"Sending batch of {len(messages)} messages...")
+        logger.debug("Sending batch of %d messages...", len(messages))
         
-        # Send messages concurrently
-        tasks = [
-            self.send_message(message, topic)
-            for message in messages
-        ]
+        # Enqueue everything first so the accumulator packs it into few requests,
+        # instead of one send_and_wait coroutine per message
+        futures = []
+        for message in messages:
+            try:
+                futures.append(await self.send_message_nowait(message, topic))
+            except Exception as e:
+                futures.append(e)
+        await self.producer.flush()
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = []
+        for message, future in zip(messages, futures):
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                record_metadata = await future
+            except Exception as e:
+                results.append(e)
+                continue
+            results.append({
+                "success": True,
+                "message_id": message.message_id,
+                "topic": record_metadata.topic,
+                "partition": record_metadata.partition,
+                "offset": record_metadata.offset,
+                "timestamp": record_metadata.timestamp,
+                "attempts": 1
+            })
         
         # Process results
         successful = sum(1 for r in results if isinstance(r, dict) and r.get("success"))
         failed = len(results) - successful
         
-        logger.info(f"Batch complete: {successful} sent, {failed} failed")
+        logger.info("Batch complete: %d sent, %d failed", successful, failed)
         
         return [r if isinstance(r, dict) else {"success": False, "error": str(r)} for r in results]
     
@@ -260,7 +438,7 @@ class KafkaProducerService:
             event_type: Type of event (e.g., "user_login", "payment_processed")
             data: Event payload data
             source: Source service/component name
-            priority: Message priority level
+            priority: Message priority level; also picks the delivery profile (PRIORITY_PROFILES)
             user_id: Optional user identifier
             session_id: Optional session identifier
             correlation_id: Optional correlation identifier for tracing
@@ -279,7 +457,36 @@ class KafkaProducerService:
             correlation_id=correlation_id
         )
         
-        return await self.send_message(message, topic)
+        service = await self._service_for(PRIORITY_PROFILES[MessagePriority(message.priority)])
+        return await service.send_message(message, topic)
+    
+    async def _service_for(self, profile: str) -> "KafkaProducerService":
+        """This service if it already has the profile, else a sibling producer configured for it"""
+        if profile == self.config.profile:
+            return self
+        service = self._profile_services.get(profile)
+        if service is not None:
+            return service
+        if time.monotonic() < self._profile_retry_at.get(profile, 0.0):
+            return self
+        async with self._profile_lock:
+            service = self._profile_services.get(profile)
+            if service is not None:
+                return service
+            if time.monotonic() < self._profile_retry_at.get(profile, 0.0):
+                return self
+            service = KafkaProducerService(self.config.with_profile(profile))
+            if not await service.start():
+                failures = self._profile_failures.get(profile, 0) + 1
+                self._profile_failures[profile] = failures
+                delay = _start_backoff(failures)
+                self._profile_retry_at[profile] = time.monotonic() + delay
+                logger.warning("Could not start %s producer, sending with %s for %.1fs", profile, self.config.profile, delay)
+                return self
+            self._profile_failures.pop(profile, None)
+            self._profile_retry_at.pop(profile, None)
+            self._profile_services[profile] = service
+            return service
     
     def get_stats(self) -> Dict[str, Any]:
         """Get producer statistics"""
@@ -322,10 +529,14 @@ class KafkaProducerService:
                 "stats": self.get_stats()
             }
     
-    @staticmethod
-    def _serialize_value(value: Any) -> bytes:
+    def _retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for send retries"""
+        delay = min(self.config.max_retry_delay, self.config.retry_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+    
+    def _serialize_value(self, value: Any) -> bytes:
         """Serialize message value to bytes"""
-        return json.dumps(value, default=str).encode("utf-8")
+        return self._encoder.encode(value)
     
     @staticmethod
     def _serialize_key(key: Any) -> Optional[bytes]:
@@ -335,13 +546,29 @@ class KafkaProducerService:
 # Singleton instance for easy import
 producer_service = None
 
+# Failed starts are retried on later calls, at most once per backoff window
+_start_failures = 0
+_next_start_at = 0.0
+_start_lock = asyncio.Lock()
+
 async def get_producer_service(config: Optional[ProducerConfig] = None) -> KafkaProducerService:
-    """Get or create producer service instance"""
-    global producer_service
+    """Get or create producer service instance, restarting it if it isn't running"""
+    global producer_service, _start_failures, _next_start_at
+    
+    if producer_service is not None and producer_service.is_running:
+        return producer_service
     
-    if producer_service is None:
-        producer_service = KafkaProducerService(config)
-        await producer_service.start()
+    async with _start_lock:
+        if producer_service is None:
+            producer_service = KafkaProducerService(config)
+        if not producer_service.is_running and time.monotonic() >= _next_start_at:
+            if await producer_service.start():
+                _start_failures = 0
+            else:
+                _start_failures += 1
+                delay = _start_backoff(_start_failures)
+                _next_start_at = time.monotonic() + delay
+                logger.warning("Kafka producer start failed %d times, next attempt in %.1fs", _start_failures, delay)
     
     return producer_service
 
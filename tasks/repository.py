@@ -1,92 +1,129 @@
 import logging
-from sqlalchemy import select, update
-from db import AsyncSessionLocal
+from typing import List, Tuple
+from sqlalchemy import bindparam, func, select, update
+from db import AsyncSessionLocal, execute_with_retry
 from outbox.crud import OutboxEvent
-from producer import get_producer_service, MessagePriority
-from datetime import datetime
+from outbox.codec import publishable_payload
+from producer import get_producer_service, Message, MessagePriority
+from datetime import timedelta
+import config
 
 logger = logging.getLogger(__name__)
 
+# Statements are built once so every call hits SQLAlchemy's compiled cache with the same object;
+# per-call values (limit, ids) are bind parameters
+_RELAY_COLUMNS = (OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.payload_format)
 
-async def _process_outbox_batch(batch_size: int = 100):
-    """Process a batch of unprocessed outbox events"""
+# Rows the web workers haven't published in time; the row locks are held until commit
+# and concurrent relays skip them instead of double-publishing
+_SELECT_PENDING = (
+    select(*_RELAY_COLUMNS)
+    .where(OutboxEvent.processed == False)
+    .where(OutboxEvent.created_at < func.now() - timedelta(seconds=config.OUTBOX_RELAY_GRACE_SECONDS))
+    .order_by(OutboxEvent.created_at)
+    .limit(bindparam("batch_size"))
+    .with_for_update(skip_locked=True)
+)
+
+_SELECT_BY_IDS = (
+    select(*_RELAY_COLUMNS)
+    .where(OutboxEvent.id.in_(bindparam("ids", expanding=True)))
+    .where(OutboxEvent.processed == False)
+    .with_for_update(skip_locked=True)
+)
+
+# Marks one event processed and hands back what to publish; rolled back if the send fails
+_CLAIM_BY_ID = (
+    update(OutboxEvent)
+    .where(OutboxEvent.id == bindparam("event_id"))
+    .where(OutboxEvent.processed == False)
+    .values(processed=True, processed_at=func.now())
+    .returning(*_RELAY_COLUMNS)
+    .execution_options(synchronize_session=False)
+)
+
+# Rows are read as plain tuples, so there is nothing in the session to synchronize
+_MARK_PROCESSED = (
+    update(OutboxEvent)
+    .where(OutboxEvent.id.in_(bindparam("ids", expanding=True)))
+    .values(processed=True, processed_at=func.now())
+    .execution_options(synchronize_session=False)
+)
+
+
+async def _process_outbox_batch(batch_size: int = 100) -> int:
+    """
+    Drain unprocessed outbox events page by page, returning how many were published
+    
+    The claim query walks ix_outbox_unprocessed (created_at WHERE processed = false)
+    in order, so its cost follows the pending backlog, not the table size.
+    """
     try:
-        async with AsyncSessionLocal() as db:
-            # Get unprocessed events
-            result = await db.execute(
-                select(OutboxEvent)
-                .where(OutboxEvent.processed == False)
-                .order_by(OutboxEvent.created_at)
-                .limit(batch_size)
-            )
-            events = result.scalars().all()
-            if not events:
-                logger.debug("No outbox events to process")
-                return
-            
-            logger.info(f"Processing {len(events)} outbox events")
-            
-            # Get producer service
-            producer = await get_producer_service()
-            
-            processed_count = 0
-            failed_count = 0
-            
-            for event in events:
-                try:
-                    # Send to Kafka
-                    result = await producer.send_event(
-                        event_type=event.event_type,
-                        data=event.payload,
-                        source="event-listener",
-                        priority=MessagePriority.NORMAL,
-                        correlation_id=str(event.id)
-                    )
-                    
-                    if result["success"]:
-                        # Mark as processed
-                        await db.execute(
-                            update(OutboxEvent)
-                            .where(OutboxEvent.id == event.id)
-                            .values(
-                                processed=True,
-                                processed_at=datetime.utcnow()
-                            )
-                        )
-                        processed_count += 1
-                        logger.debug(f"Published outbox event {event.id} to Kafka")
-                    else:
-                        failed_count += 1
-                        logger.warning(f"Failed to publish outbox event {event.id}: {result}")
-                        
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Error processing outbox event {event.id}: {e}")
-            
-            # Commit all processed events at once
-            await db.commit()
-            
-            if processed_count > 0 or failed_count > 0:
-                logger.info(f"Outbox batch complete: {processed_count} processed, {failed_count} failed")
+        published_total = 0
+        while True:
+            claimed, published = await _process_outbox_page(batch_size)
+            published_total += published
+            # A short page means the backlog is empty; no progress means Kafka is failing
+            if claimed < batch_size or not published:
+                return published_total
                 
     except Exception as e:
-        logger.error(f"Error in outbox batch processing: {e}")
+        logger.error("Error in outbox batch processing: %s", e)
         raise
 
+async def _process_outbox_page(batch_size: int) -> Tuple[int, int]:
+    """Process one page of outbox events, returning (claimed, published) counts"""
+    async with AsyncSessionLocal() as db:
+        # Plain rows with just what the send needs; no ORM hydration or identity map
+        result = await db.execute(_SELECT_PENDING, {"batch_size": batch_size})
+        events = result.all()
+        if not events:
+            logger.debug("No outbox events to process")
+            return 0, 0
+        
+        # Get producer service
+        producer = await get_producer_service()
+        
+        # Queue the whole batch on the producer and flush once, instead of awaiting each ack in turn
+        results = await producer.send_batch([
+            Message(
+                event_type=event.event_type,
+                data=publishable_payload(event.payload, event.payload_format, producer.config.message_format),
+                source="event-listener",
+                priority=MessagePriority.NORMAL,
+                correlation_id=str(event.id)
+            )
+            for event in events
+        ])
+        
+        processed_ids = []
+        failed_count = 0
+        for event, result in zip(events, results):
+            if result["success"]:
+                processed_ids.append(event.id)
+            else:
+                failed_count += 1
+                logger.warning("Failed to publish outbox event %s: %s", event.id, result)
+        
+        if processed_ids:
+            # Mark the whole batch as processed in one statement
+            await db.execute(_MARK_PROCESSED, {"ids": processed_ids})
+        await db.commit()
+        
+        if processed_ids or failed_count > 0:
+            logger.info("Outbox batch complete: %d processed, %d failed", len(processed_ids), failed_count)
+        return len(events), len(processed_ids)
+
 async def _publish_event_by_id(event_id: int):
     """Publish a specific event by ID"""
     try:
         async with AsyncSessionLocal() as db:
-            # Get the specific event
-            result = await db.execute(
-                select(OutboxEvent)
-                .where(OutboxEvent.id == event_id)
-                .where(OutboxEvent.processed == False)
-            )
-            event = result.scalar_one_or_none()
+            # Claim and fetch in one round trip; the row stays locked until commit/rollback
+            result = await db.execute(_CLAIM_BY_ID, {"event_id": event_id})
+            event = result.first()
             
             if not event:
-                logger.warning(f"Outbox event {event_id} not found or already processed")
+                logger.debug("Outbox event %s not found or already processed", event_id)
                 return
             
             # Get producer service
@@ -95,28 +132,61 @@ async def _publish_event_by_id(event_id: int):
             # Send to Kafka
             result = await producer.send_event(
                 event_type=event.event_type,
-                data=event.payload,
+                data=publishable_payload(event.payload, event.payload_format, producer.config.message_format),
                 source="event-listener",
                 priority=MessagePriority.HIGH,  # Higher priority for single events
                 correlation_id=str(event.id)
             )
             
             if result["success"]:
-                # Mark as processed
-                await db.execute(
-                    update(OutboxEvent)
-                    .where(OutboxEvent.id == event.id)
-                    .values(
-                        processed=True,
-                        processed_at=datetime.utcnow()
-                    )
-                )
+                # Only now does processed=true become visible
                 await db.commit()
-                logger.info(f"Successfully published single event {event_id} to Kafka")
+                logger.debug("Successfully published single event %s to Kafka", event_id)
             else:
-                logger.error(f"Failed to publish single event {event_id}: {result}")
+                # Leave the row unprocessed for the relays
+                await db.rollback()
+                logger.error("Failed to publish single event %s: %s", event_id, result)
                 raise Exception(f"Failed to publish event: {result}")
                 
     except Exception as e:
-        logger.error(f"Error publishing single event {event_id}: {e}")
-        raise
\ No newline at end of file
+        logger.error("Error publishing single event %s: %s", event_id, e)
+        raise
+
+
+async def _publish_events_by_ids(event_ids: List[int]) -> int:
+    """Publish a group of outbox events by ID with one SELECT and one UPDATE; returns how many failed"""
+    async with AsyncSessionLocal() as db:
+        # Retry the DB steps only; retrying the whole call would re-send what already reached Kafka
+        result = await execute_with_retry(db, _SELECT_BY_IDS, {"ids": event_ids})
+        events = result.all()
+
+        if not events:
+            return 0
+
+        producer = await get_producer_service()
+
+        # One producer flush for the group; nothing waits on an individual broker ack
+        results = await producer.send_batch([
+            Message(
+                event_type=event.event_type,
+                data=publishable_payload(event.payload, event.payload_format, producer.config.message_format),
+                source="event-listener",
+                priority=MessagePriority.HIGH,
+                correlation_id=str(event.id)
+            )
+            for event in events
+        ])
+
+        published_ids = [
+            event.id for event, result in zip(events, results)
+            if result["success"]
+        ]
+        if published_ids:
+            # Setting processed again is harmless, so this is safe to repeat on a fresh connection
+            await execute_with_retry(db, _MARK_PROCESSED, {"ids": published_ids})
+            await db.commit()
+
+        failed_count = len(events) - len(published_ids)
+        if failed_count:
+            logger.warning("Failed to publish %d of %d outbox events, leaving them for the outbox processor", failed_count, len(events))
+        return failed_count
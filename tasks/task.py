@@ -1,24 +1,70 @@
 import asyncio
 import logging
+import time
+import redis
+import config
+from typing import Optional
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 from celery_config import celery
-from db import _test_db_connection
+from db import engine, _test_db_connection
+from producer import get_producer_service, cleanup_producer_service
 from tasks.repository import _process_outbox_batch, _publish_event_by_id
-from datetime import datetime
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
-# Get or create event loop for Celery workers
-def get_event_loop():
-    """Get or create an event loop for the current thread"""
+# One loop per worker process, kept for its lifetime so the SQLAlchemy pool and
+# the Kafka producer (both bound to it) are reused across tasks
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _init_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    _LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(_LOOP)
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop
+        _LOOP.run_until_complete(_warm_up())
+    except Exception as e:
+        logger.warning("Worker warm-up failed, connecting on first task: %s", e)
+    return _LOOP
+
+
+async def _warm_up():
+    """Open a DB connection and start the producer before the first task arrives"""
+    await _test_db_connection()
+    await get_producer_service()
+
+
+async def _close_resources():
+    await cleanup_producer_service()
+    await engine.dispose()
+
+
+@worker_process_init.connect
+def init_worker_loop(**kwargs):
+    _init_loop()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_worker_loop(**kwargs):
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        return
+    try:
+        _LOOP.run_until_complete(_close_resources())
+    except Exception as e:
+        logger.warning("Error closing worker resources: %s", e)
+    finally:
+        _LOOP.close()
+        _LOOP = None
+
+
+def get_event_loop():
+    """The worker's long-lived loop; the solo pool never sends worker_process_init, so it's created on first use"""
+    if _LOOP is None or _LOOP.is_closed():
+        return _init_loop()
+    return _LOOP
 
 @celery.task(bind=True, max_retries=3)
 def process_outbox_events(self):
@@ -28,10 +74,10 @@ def process_outbox_events(self):
     """
     try:
         loop = get_event_loop()
-        loop.run_until_complete(_process_outbox_batch())
-        return {"status": "success", "processed_at": datetime.utcnow().isoformat()}
+        loop.run_until_complete(_process_outbox_batch(config.OUTBOX_BATCH_SIZE))
+        return {"status": "success", "processed_at": datetime.now(timezone.utc).isoformat()}
     except Exception as e:
-        logger.error(f"Error in Celery outbox processor: {e}")
+        logger.error("Error in Celery outbox processor: %s", e)
         # Retry with exponential backoff
         raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
 
@@ -44,29 +90,40 @@ def publish_single_event(self, event_id: int):
     try:
         loop = get_event_loop()
         loop.run_until_complete(_publish_event_by_id(event_id))
-        return {"status": "success", "event_id": event_id, "published_at": datetime.utcnow().isoformat()}
+        return {"status": "success", "event_id": event_id, "published_at": datetime.now(timezone.utc).isoformat()}
     except Exception as e:
-        logger.error(f"Error publishing event {event_id}: {e}")
+        logger.error("Error publishing event %s: %s", event_id, e)
         raise self.retry(exc=e, countdown=30 * (2 ** self.request.retries))
 
 
-# Health check task
-@celery.task
+_redis = None
+
+def get_redis():
+    """Lazily created Redis client for the worker process"""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(config.REDIS_URL)
+    return _redis
+
+# Health check task; liveness is the Redis key, so beat runs don't need stored results
+@celery.task(ignore_result=True)
 def health_check():
-    """Health check task for monitoring"""
+    """Health check task for monitoring; publishes the last healthy time to Redis"""
     try:
         loop = get_event_loop()
         resp = loop.run_until_complete(_test_db_connection())
-        logger.debug(f"Health check DB response: {resp}")
+        logger.debug("Health check DB response: %s", resp)
+        # The web reads this key instead of round-tripping a task through the broker
+        get_redis().setex(config.CELERY_HEALTH_KEY, config.CELERY_HEALTH_TTL, time.time())
         return {
             "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "service": "celery_outbox_processor"
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "service": "celery_outbox_processor"
         }